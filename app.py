@@ -1,11 +1,12 @@
 import streamlit as st
 import os
-import tempfile
-import base64
+import hashlib
+import html
+from datetime import datetime
 from pdf_processor import extract_text_from_pdf
 from text_comparison import compare_texts, generate_summary
 from utils import highlight_differences, display_summary, create_navigation_buttons
-from export_utils import export_as_html, export_as_pdf
+from export_utils import create_export_html, render_pdf_report, report_filename, REPORT_TIME_FORMAT
 
 # Set page configuration
 st.set_page_config(
@@ -14,102 +15,191 @@ st.set_page_config(
     layout="wide"
 )
 
-# Custom CSS to enhance UI
+# Fingerprint of an uploaded file, used to spot when the uploads change
+def _file_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# Cached wrappers so that Streamlit reruns (switching tabs, downloads, etc.)
+# reuse earlier results instead of re-parsing and re-diffing the PDFs
+@st.cache_data(show_spinner=False, max_entries=32)
+def _extract_cached(pdf_bytes):
+    return extract_text_from_pdf(pdf_bytes)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _compare_cached(text1, text2):
+    return compare_texts(text1, text2)
+
+# Stands in for the generation time in the cached HTML report; the actual
+# time is filled in on every run so that downloads aren't stamped with the
+# time the report was first built
+_GENERATED_ON_PLACEHOLDER = "%%GENERATED_ON%%"
+
+# The exports take no diffs argument: the highlighted HTML already holds
+# everything they need, and st.cache_data would otherwise hash every entry
+# of the diffs on every call
+@st.cache_data(show_spinner=False, max_entries=32)
+def _export_html_cached(pdf1_name, pdf2_name, summary, old_html, new_html):
+    return create_export_html(pdf1_name, pdf2_name, None, summary, old_html, new_html,
+                              generated_on=_GENERATED_ON_PLACEHOLDER)
+
+# Rendering the PDF is slow, so the bytes are cached together with the time
+# rendered into them; the filename is stamped with that same time so that
+# it matches the report's "Generated on" line
+@st.cache_data(show_spinner=False, max_entries=32)
+def _export_pdf_cached(pdf1_name, pdf2_name, summary, old_html, new_html):
+    generated_at = datetime.now()
+    pdf_bytes = render_pdf_report(pdf1_name, pdf2_name, None, summary, old_html, new_html,
+                                  generated_on=generated_at.strftime(REPORT_TIME_FORMAT))
+    return pdf_bytes, generated_at
+
+# Custom CSS to enhance UI, kept in static/custom.css
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "custom.css")
+
+@st.cache_data(show_spinner=False)
+def _load_css():
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f.read()
+
 def apply_custom_css():
-    st.markdown("""
-    <style>
-    .main .block-container {
-        padding-top: 2rem;
-        padding-bottom: 2rem;
-        position: relative;
-    }
-    h1 {
-        color: #FF4081;
-        font-size: 3.5rem !important;
-        text-align: center;
-        margin-bottom: 1rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-    h2 {
-        color: #553BFF;
-        font-size: 2.2rem !important;
-        margin-top: 2rem;
-        border-bottom: 2px solid #FFECFD;
-        padding-bottom: 0.5rem;
-    }
-    h3 {
-        color: #0CA4A5;
-        font-size: 1.5rem !important;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 24px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        height: 50px;
-        white-space: pre-wrap;
-        border-radius: 4px 4px 0px 0px;
-        font-weight: 500;
-        background-color: #f9f9f9;
-        border-left: 1px solid #ccc;
-        border-right: 1px solid #ccc;
-        border-top: 1px solid #ccc;
-    }
-    .stTabs [aria-selected="true"] {
-        background-color: #FF4081 !important;
-        color: white !important;
-    }
-    .stButton button {
-        background-color: #FF4081;
-        color: white;
-        border-radius: 20px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 500;
-        border: none;
-        box-shadow: 0px 3px 5px rgba(0,0,0,0.1);
-        transition: all 0.3s;
-    }
-    .stButton button:hover {
-        background-color: #E5004E;
-        box-shadow: 0px 5px 8px rgba(0,0,0,0.2);
-    }
-    div.stFileUploader > div[data-baseweb="file-uploader"] {
-        border: 2px dashed #FF4081;
-        border-radius: 10px;
-        background-color: #FFECFD;
-        padding: 20px;
-    }
-    div.stFileUploader [data-testid="stMarkdownContainer"] p {
-        color: #777;
-        font-size: 1rem;
-    }
-    .company-logo {
-        position: absolute;
-        top: 10px;
-        right: 20px;
-        font-size: 16px;
-        z-index: 1000;
-        display: flex;
-        align-items: center;
-        background: linear-gradient(45deg, #FF4081, #553BFF);
-        padding: 8px 16px;
-        border-radius: 20px;
-        color: white;
-        font-weight: bold;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    .company-logo::before {
-        content: "🧠";
-        margin-right: 8px;
-        font-size: 22px;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # Streamlit drops anything that isn't emitted again on a rerun, so the
+    # styles are injected every run; only reading the file is cached
+    st.markdown(f"<style>{_load_css()}</style>", unsafe_allow_html=True)
     
     # Add the company logo at the top right
     st.markdown("""
     <div class="company-logo">Ideasouq Technologies</div>
     """, unsafe_allow_html=True)
 
+# Fragments only rerun themselves when a widget inside them is used, so e.g.
+# clicking a download button doesn't rerun the whole comparison page
+@st.fragment
+def render_exports(pdf1_name, pdf2_name, summary, old_html, new_html):
+    # Add export buttons
+    st.markdown("<h3 style='color: #553BFF;'>Export Results</h3>", unsafe_allow_html=True)
+    
+    export_col1, export_col2 = st.columns(2)
+    
+    # Timestamp of this run's HTML download; computed outside the cached call
+    generated_at = datetime.now()
+    
+    with export_col1:
+        try:
+            # Export as HTML
+            html_content = _export_html_cached(pdf1_name, pdf2_name, summary, old_html, new_html)
+            # The placeholder is the first occurrence, ahead of the file names
+            html_content = html_content.replace(_GENERATED_ON_PLACEHOLDER, generated_at.strftime(REPORT_TIME_FORMAT), 1)
+            html_filename = report_filename('html', generated_at)
+    
+            # Use Streamlit button instead of HTML
+            with st.container():
+                download_col1, download_col2 = st.columns([1, 10])
+                with download_col1:
+                    st.markdown("📄", unsafe_allow_html=True)
+                with download_col2:
+                    st.download_button(
+                        label="Download as HTML",
+                        data=html_content,
+                        file_name=html_filename,
+                        mime="text/html",
+                        use_container_width=True
+                    )
+        except Exception as e:
+            st.error(f"Error generating HTML export: {str(e)}")
+    
+    with export_col2:
+        try:
+            # Export as PDF
+            pdf_bytes, pdf_generated_at = _export_pdf_cached(pdf1_name, pdf2_name, summary, old_html, new_html)
+            pdf_filename = report_filename('pdf', pdf_generated_at)
+    
+            # Use Streamlit button for PDF download
+            with st.container():
+                download_col1, download_col2 = st.columns([1, 10])
+                with download_col1:
+                    st.markdown("📊", unsafe_allow_html=True)
+                with download_col2:
+                    st.download_button(
+                        label="Download as PDF",
+                        data=pdf_bytes,
+                        file_name=pdf_filename,
+                        mime="application/pdf",
+                        use_container_width=True
+                    )
+        except Exception as e:
+            st.error(f"Error generating PDF export: {str(e)}")
+
+@st.fragment
+def render_differences(old_html, new_html, old_nav, new_nav):
+    # Display text differences
+    st.markdown("<h2 style='color: #553BFF; text-align: center; margin-top: 30px;'>Detailed Differences</h2>", unsafe_allow_html=True)
+    
+    # Create tabs for different views with custom styling
+    tab1, tab2, tab3 = st.tabs(["✨ Side by Side", "📄 First PDF", "📄 Second PDF"])
+    
+    with tab1:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>First PDF</h3>", unsafe_allow_html=True)
+    
+            # Add navigation buttons for first PDF
+            st.markdown(old_nav, unsafe_allow_html=True)
+    
+            st.markdown(
+                f"""<div id="pdf1-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
+                {old_html}
+                </div>""", 
+                unsafe_allow_html=True
+            )
+    
+        with col2:
+            st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>Second PDF</h3>", unsafe_allow_html=True)
+    
+            # Add navigation buttons for second PDF
+            st.markdown(new_nav, unsafe_allow_html=True)
+    
+            st.markdown(
+                f"""<div id="pdf2-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
+                {new_html}
+                </div>""", 
+                unsafe_allow_html=True
+            )
+    
+    with tab2:
+        st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>First PDF</h3>", unsafe_allow_html=True)
+    
+        # Add navigation buttons for first PDF (single view)
+        st.markdown(old_nav, unsafe_allow_html=True)
+    
+        st.markdown(
+            f"""<div id="pdf1-single-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; max-width: 800px; margin: 0 auto; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
+            {old_html}
+            </div>""", 
+            unsafe_allow_html=True
+        )
+    
+    with tab3:
+        st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>Second PDF</h3>", unsafe_allow_html=True)
+    
+        # Add navigation buttons for second PDF (single view)
+        st.markdown(new_nav, unsafe_allow_html=True)
+    
+        st.markdown(
+            f"""<div id="pdf2-single-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; max-width: 800px; margin: 0 auto; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
+            {new_html}
+            </div>""", 
+            unsafe_allow_html=True
+        )
+
+# Shown instead of the comparison when both uploads are the same file
+def render_identical(pdf1_name, pdf2_name):
+    st.header("Comparison Results")
+    st.markdown(f"""
+    <div style="background-color: #f0fff0; padding: 20px; border-radius: 10px; border-left: 5px solid #0CA4A5; margin: 20px 0; text-align: center;">
+        <h3 style="color: #0CA4A5; margin-top: 0;">The documents are identical</h3>
+        <p style="color: #555;">{html.escape(pdf1_name)} and {html.escape(pdf2_name)} have exactly the same content, so there are no differences to show.</p>
+    </div>
+    """, unsafe_allow_html=True)
+
 def main():
     apply_custom_css()
     
@@ -157,163 +247,80 @@ def main():
     
     # Process the PDFs when both are uploaded
     if pdf1 and pdf2:
-        with st.spinner("🔄 Processing PDFs... Please wait"):
-            # Save uploaded files to temp directory
-            temp_dir = tempfile.TemporaryDirectory()
-            pdf1_path = os.path.join(temp_dir.name, "pdf1.pdf")
-            pdf2_path = os.path.join(temp_dir.name, "pdf2.pdf")
-            
-            with open(pdf1_path, "wb") as f:
-                f.write(pdf1.getvalue())
-            
-            with open(pdf2_path, "wb") as f:
-                f.write(pdf2.getvalue())
-            
-            # Extract text from PDFs
-            try:
-                text1 = extract_text_from_pdf(pdf1_path)
-                text2 = extract_text_from_pdf(pdf2_path)
-                
-                if not text1.strip():
-                    st.error("Could not extract text from the first PDF. It might be a scanned document or protected.")
-                    return
-                
-                if not text2.strip():
-                    st.error("Could not extract text from the second PDF. It might be a scanned document or protected.")
-                    return
-                
-                # Compare texts
-                diffs = compare_texts(text1, text2)
-                
-                # Generate summary
-                summary = generate_summary(diffs)
-                
-                # Display results
-                st.header("Comparison Results")
-                
-                # Display summary statistics
-                display_summary(summary)
-                
-                # Add export buttons
-                st.markdown("<h3 style='color: #553BFF;'>Export Results</h3>", unsafe_allow_html=True)
-                
-                export_col1, export_col2 = st.columns(2)
-                
-                with export_col1:
+        # Only recompute when the uploaded files change; other reruns reuse
+        # the results kept in the session state
+        comparison_key = (_file_digest(pdf1.getvalue()), _file_digest(pdf2.getvalue()))
+        
+        # Byte-identical files can't differ, so skip extraction and diffing
+        if comparison_key[0] == comparison_key[1]:
+            render_identical(pdf1.name, pdf2.name)
+            return
+        
+        if st.session_state.get('comparison_key') != comparison_key:
+            with st.spinner("🔄 Processing PDFs... Please wait"):
+                # Extract text from PDFs
+                try:
+                    # Extraction raises ValueError with the reason when a
+                    # PDF is encrypted or unreadable
                     try:
-                        # Export as HTML
-                        html_content, html_filename = export_as_html(pdf1.name, pdf2.name, diffs, summary)
-                        
-                        # Create download button with Streamlit component
-                        b64_html = base64.b64encode(html_content.encode()).decode()
-                        download_link = f'data:text/html;base64,{b64_html}'
-                        
-                        # Use Streamlit button instead of HTML
-                        with st.container():
-                            download_col1, download_col2 = st.columns([1, 10])
-                            with download_col1:
-                                st.markdown("📄", unsafe_allow_html=True)
-                            with download_col2:
-                                st.download_button(
-                                    label="Download as HTML",
-                                    data=html_content,
-                                    file_name=html_filename,
-                                    mime="text/html",
-                                    use_container_width=True
-                                )
-                    except Exception as e:
-                        st.error(f"Error generating HTML export: {str(e)}")
-                
-                with export_col2:
+                        text1 = _extract_cached(pdf1.getvalue())
+                    except ValueError as e:
+                        st.error(f"Could not extract text from the first PDF: {str(e)}")
+                        return
+                    
                     try:
-                        # Export as PDF
-                        pdf_bytes, pdf_filename = export_as_pdf(pdf1.name, pdf2.name, diffs, summary)
-                        
-                        # Use Streamlit button for PDF download
-                        with st.container():
-                            download_col1, download_col2 = st.columns([1, 10])
-                            with download_col1:
-                                st.markdown("📊", unsafe_allow_html=True)
-                            with download_col2:
-                                st.download_button(
-                                    label="Download as PDF",
-                                    data=pdf_bytes,
-                                    file_name=pdf_filename,
-                                    mime="application/pdf",
-                                    use_container_width=True
-                                )
-                    except Exception as e:
-                        st.error(f"Error generating PDF export: {str(e)}")
-                
-                # Display text differences
-                st.markdown("<h2 style='color: #553BFF; text-align: center; margin-top: 30px;'>Detailed Differences</h2>", unsafe_allow_html=True)
-                
-                # Create tabs for different views with custom styling
-                tab1, tab2, tab3 = st.tabs(["✨ Side by Side", "📄 First PDF", "📄 Second PDF"])
-                
-                with tab1:
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>First PDF</h3>", unsafe_allow_html=True)
-                        
-                        # Add navigation buttons for first PDF
-                        nav_buttons_old = create_navigation_buttons(diffs, "pdf1-container", "old")
-                        st.markdown(nav_buttons_old, unsafe_allow_html=True)
-                        
-                        st.markdown(
-                            f"""<div id="pdf1-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
-                            {highlight_differences(diffs, 'old')}
-                            </div>""", 
-                            unsafe_allow_html=True
-                        )
+                        text2 = _extract_cached(pdf2.getvalue())
+                    except ValueError as e:
+                        st.error(f"Could not extract text from the second PDF: {str(e)}")
+                        return
                     
-                    with col2:
-                        st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>Second PDF</h3>", unsafe_allow_html=True)
-                        
-                        # Add navigation buttons for second PDF
-                        nav_buttons_new = create_navigation_buttons(diffs, "pdf2-container", "new")
-                        st.markdown(nav_buttons_new, unsafe_allow_html=True)
-                        
-                        st.markdown(
-                            f"""<div id="pdf2-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
-                            {highlight_differences(diffs, 'new')}
-                            </div>""", 
-                            unsafe_allow_html=True
-                        )
-                
-                with tab2:
-                    st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>First PDF</h3>", unsafe_allow_html=True)
+                    # An empty result means no text could be extracted
+                    if not text1:
+                        st.error("Could not extract text from the first PDF. It might be a scanned document or protected.")
+                        return
                     
-                    # Add navigation buttons for first PDF (single view)
-                    nav_buttons_old_single = create_navigation_buttons(diffs, "pdf1-single-container", "old")
-                    st.markdown(nav_buttons_old_single, unsafe_allow_html=True)
+                    if not text2:
+                        st.error("Could not extract text from the second PDF. It might be a scanned document or protected.")
+                        return
                     
-                    st.markdown(
-                        f"""<div id="pdf1-single-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; max-width: 800px; margin: 0 auto; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
-                        {highlight_differences(diffs, 'old')}
-                        </div>""", 
-                        unsafe_allow_html=True
-                    )
-                
-                with tab3:
-                    st.markdown("<h3 style='color: #0CA4A5; text-align: center; margin-bottom: 15px;'>Second PDF</h3>", unsafe_allow_html=True)
+                    # Compare texts
+                    diffs = _compare_cached(text1, text2)
                     
-                    # Add navigation buttons for second PDF (single view)
-                    nav_buttons_new_single = create_navigation_buttons(diffs, "pdf2-single-container", "new")
-                    st.markdown(nav_buttons_new_single, unsafe_allow_html=True)
+                    # Generate summary; counting is cheap compared with
+                    # hashing the diffs for a cache lookup
+                    summary = generate_summary(diffs)
                     
-                    st.markdown(
-                        f"""<div id="pdf2-single-container" style='border: 1px solid #ddd; border-radius: 8px; padding: 15px; max-width: 800px; margin: 0 auto; height: 500px; overflow-y: auto; background-color: #fcfcfc;'>
-                        {highlight_differences(diffs, 'new')}
-                        </div>""", 
-                        unsafe_allow_html=True
-                    )
-                
-            except Exception as e:
-                st.error(f"An error occurred during processing: {str(e)}")
-            finally:
-                # Clean up temp files
-                temp_dir.cleanup()
+                    # Render the highlighted documents once and reuse them
+                    # for every tab and for the exports
+                    st.session_state['summary'] = summary
+                    st.session_state['old_html'] = highlight_differences(diffs, 'old')
+                    st.session_state['new_html'] = highlight_differences(diffs, 'new')
+                    # The buttons only depend on the summary's counts, so
+                    # build each version once for all of its views
+                    st.session_state['old_nav'] = create_navigation_buttons(summary, "pdf1-container", "old")
+                    st.session_state['new_nav'] = create_navigation_buttons(summary, "pdf2-container", "new")
+                    st.session_state['comparison_key'] = comparison_key
+                except Exception as e:
+                    st.error(f"An error occurred during processing: {str(e)}")
+                    return
+        
+        summary = st.session_state['summary']
+        old_html = st.session_state['old_html']
+        new_html = st.session_state['new_html']
+        old_nav = st.session_state['old_nav']
+        new_nav = st.session_state['new_nav']
+        
+        try:
+            # Display results
+            st.header("Comparison Results")
+            
+            # Display summary statistics
+            display_summary(summary)
+            
+            render_exports(pdf1.name, pdf2.name, summary, old_html, new_html)
+            render_differences(old_html, new_html, old_nav, new_nav)
+        except Exception as e:
+            st.error(f"An error occurred during processing: {str(e)}")
     else:
         # Display attractive instructions with illustrations when files are not yet uploaded
         st.markdown("""
@@ -1,58 +1,30 @@
-import os
-import tempfile
 from datetime import datetime
 import streamlit as st
 import weasyprint
+from weasyprint.text.fonts import FontConfiguration
 from utils import highlight_differences
 
-def create_export_html(pdf1_name, pdf2_name, diffs, summary):
-    """
-    Create HTML content for export with comparison results.
-    
-    Args:
-        pdf1_name (str): The name of the first PDF
-        pdf2_name (str): The name of the second PDF
-        diffs (list): List of difference objects
-        summary (dict): Summary of the comparison
-        
-    Returns:
-        str: HTML content
-    """
-    # Sanitize content to prevent code display
-    def sanitize_content(content):
-        # Replace < and > to prevent any HTML/code rendering
-        content = content.replace('<', '&lt;').replace('>', '&gt;')
-        return content
-    # Format current date and time
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Create HTML document
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>PDF Comparison Report</title>
-    <style>
-        body {{
+# Static parts of the export report, built once at import. Only the
+# summary numbers and the highlighted documents change between reports.
+_EXPORT_CSS = """        body {
             font-family: Arial, sans-serif;
             line-height: 1.6;
             color: #333;
             max-width: 1200px;
             margin: 0 auto;
             padding: 20px;
-        }}
-        .header {{
+        }
+        .header {
             text-align: center;
             margin-bottom: 30px;
             padding-bottom: 20px;
             border-bottom: 1px solid #eee;
-        }}
-        .header h1 {{
+        }
+        .header h1 {
             color: #FF4081;
             margin-bottom: 10px;
-        }}
-        .logo {{
+        }
+        .logo {
             position: absolute;
             top: 20px;
             right: 20px;
@@ -62,34 +34,34 @@ def create_export_html(pdf1_name, pdf2_name, diffs, summary):
             color: white;
             font-weight: bold;
             background: linear-gradient(45deg, #FF4081, #553BFF);
-        }}
-        .logo::before {{
+        }
+        .logo::before {
             content: "🧠";
             margin-right: 8px;
-        }}
-        .meta-info {{
+        }
+        .meta-info {
             color: #666;
             font-size: 14px;
             margin-bottom: 5px;
-        }}
-        .summary {{
+        }
+        .summary {
             background-color: #f9f9f9;
             border-radius: 15px;
             padding: 20px;
             margin-bottom: 30px;
             box-shadow: 0 4px 8px rgba(0,0,0,0.05);
-        }}
-        .summary h2 {{
+        }
+        .summary h2 {
             color: #553BFF;
             text-align: center;
             margin-top: 0;
-        }}
-        .stats {{
+        }
+        .stats {
             display: flex;
             justify-content: space-between;
             flex-wrap: wrap;
-        }}
-        .stat-box {{
+        }
+        .stat-box {
             flex: 1;
             min-width: 150px;
             background: white;
@@ -98,94 +70,112 @@ def create_export_html(pdf1_name, pdf2_name, diffs, summary):
             margin: 10px;
             box-shadow: 0 2px 4px rgba(0,0,0,0.05);
             text-align: center;
-        }}
-        .stat-value {{
+        }
+        .stat-value {
             font-size: 24px;
             font-weight: bold;
             margin: 10px 0;
-        }}
-        .stat-label {{
+        }
+        .stat-label {
             color: #666;
             font-size: 14px;
-        }}
-        .color-additions {{
+        }
+        .color-additions {
             color: #4CAF50;
-        }}
-        .color-deletions {{
+        }
+        .color-deletions {
             color: #F44336;
-        }}
-        .color-modifications {{
+        }
+        .color-modifications {
             color: #FFC107;
-        }}
-        .legend {{
+        }
+        .legend {
             display: flex;
             justify-content: center;
             margin: 20px 0;
             flex-wrap: wrap;
-        }}
-        .legend-item {{
+        }
+        .legend-item {
             margin: 10px;
             display: flex;
             align-items: center;
-        }}
-        .color-box {{
+        }
+        .color-box {
             width: 20px;
             height: 20px;
             margin-right: 5px;
             border-radius: 4px;
-        }}
-        .bg-green {{
+        }
+        .bg-green {
             background-color: #CCFFCC;
-        }}
-        .bg-red {{
+        }
+        .bg-red {
             background-color: #FFCCCC;
-        }}
-        .bg-yellow {{
+        }
+        .bg-yellow {
             background-color: #FFFFCC;
-        }}
-        .details {{
+        }
+        .details {
             display: grid;
             grid-template-columns: 1fr 1fr;
             gap: 20px;
             margin-top: 30px;
-        }}
-        .document {{
+        }
+        .document {
             border: 1px solid #ddd;
             border-radius: 8px;
             padding: 20px;
             background-color: #fcfcfc;
-        }}
-        .document h3 {{
+        }
+        .document h3 {
             color: #0CA4A5;
             text-align: center;
             margin-top: 0;
             margin-bottom: 20px;
             padding-bottom: 10px;
             border-bottom: 1px solid #eee;
-        }}
-        .footer {{
+        }
+        .footer {
             margin-top: 50px;
             text-align: center;
             font-size: 12px;
             color: #999;
             padding-top: 20px;
             border-top: 1px solid #eee;
-        }}
-        @media print {{
-            body {{
+        }
+        @media print {
+            body {
                 padding: 0;
                 font-size: 12px;
-            }}
-            .summary, .document {{
+            }
+            .summary, .document {
                 break-inside: avoid;
-            }}
-        }}
-    </style>
-</head>
+            }
+        }
+"""
+
+_HTML_HEAD_OPEN = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>PDF Comparison Report</title>
+"""
+
+_HTML_HEAD_CLOSE = """</head>
 <body>
     <div class="logo">Ideasouq Technologies</div>
     
-    <div class="header">
+"""
+
+_HTML_HEAD = _HTML_HEAD_OPEN + """    <style>
+""" + _EXPORT_CSS + """    </style>
+""" + _HTML_HEAD_CLOSE
+
+# Head without the inline stylesheet, for when it is supplied separately
+_HTML_HEAD_UNSTYLED = _HTML_HEAD_OPEN + _HTML_HEAD_CLOSE
+
+_HTML_SUMMARY = """    <div class="header">
         <h1>PDF Comparison Report</h1>
         <div class="meta-info">Generated on: {current_time}</div>
         <div class="meta-info">Files compared: {pdf1_name} vs {pdf2_name}</div>
@@ -197,25 +187,25 @@ def create_export_html(pdf1_name, pdf2_name, diffs, summary):
         <div class="stats">
             <div class="stat-box">
                 <div class="stat-label">Additions</div>
-                <div class="stat-value color-additions">{summary['additions']['count']}</div>
-                <div class="stat-label">{summary['additions']['words']} words</div>
+                <div class="stat-value color-additions">{additions_count}</div>
+                <div class="stat-label">{additions_words} words</div>
             </div>
             
             <div class="stat-box">
                 <div class="stat-label">Deletions</div>
-                <div class="stat-value color-deletions">{summary['deletions']['count']}</div>
-                <div class="stat-label">{summary['deletions']['words']} words</div>
+                <div class="stat-value color-deletions">{deletions_count}</div>
+                <div class="stat-label">{deletions_words} words</div>
             </div>
             
             <div class="stat-box">
                 <div class="stat-label">Modifications</div>
-                <div class="stat-value color-modifications">{summary['modifications']['count']}</div>
-                <div class="stat-label">{summary['modifications']['words_new'] - summary['modifications']['words_old']} word difference</div>
+                <div class="stat-value color-modifications">{modifications_count}</div>
+                <div class="stat-label">{modifications_words} word difference</div>
             </div>
             
             <div class="stat-box">
                 <div class="stat-label">Unchanged</div>
-                <div class="stat-value">{summary['unchanged']['count']}</div>
+                <div class="stat-value">{unchanged_count}</div>
                 <div class="stat-label">sections</div>
             </div>
         </div>
@@ -236,77 +226,136 @@ def create_export_html(pdf1_name, pdf2_name, diffs, summary):
         </div>
     </div>
     
-    <h2 style="text-align: center; color: #553BFF;">Detailed Differences</h2>
+"""
+
+_HTML_DETAILS = """    <h2 style="text-align: center; color: #553BFF;">Detailed Differences</h2>
     
     <div class="details">
         <div class="document">
             <h3>First PDF</h3>
-            {highlight_differences(diffs, 'old')}
+            {old_html}
         </div>
         
         <div class="document">
             <h3>Second PDF</h3>
-            {highlight_differences(diffs, 'new')}
+            {new_html}
         </div>
     </div>
     
-    <div class="footer">
+"""
+
+_HTML_FOOTER = """    <div class="footer">
         <p>Generated by PDF Comparison Tool | Ideasouq Technologies</p>
     </div>
 </body>
 </html>
 """
-    return html
 
-def export_as_html(pdf1_name, pdf2_name, diffs, summary):
+# Formats of the report's "Generated on" line and the filename timestamps
+REPORT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FILENAME_TIME_FORMAT = "%Y%m%d_%H%M%S"
+
+@st.cache_resource
+def _font_config():
+    # Setting up the font stack is one of WeasyPrint's slowest steps, so
+    # share a single configuration between all PDF exports
+    return FontConfiguration()
+
+@st.cache_resource
+def _export_stylesheet():
+    # The report stylesheet never changes; parse it once
+    return weasyprint.CSS(string=_EXPORT_CSS, font_config=_font_config())
+
+def report_filename(extension, generated_at=None):
     """
-    Generate and provide an HTML file for download
+    Build the download filename of a comparison report.
+    
+    Args:
+        extension (str): File extension, e.g. 'html' or 'pdf'
+        generated_at (datetime, optional): Time to stamp the name with,
+            defaults to now
+        
+    Returns:
+        str: Filename like comparison_report_20250101_120000.pdf
+    """
+    if generated_at is None:
+        generated_at = datetime.now()
+    return f"comparison_report_{generated_at.strftime(FILENAME_TIME_FORMAT)}.{extension}"
+
+def create_export_html(pdf1_name, pdf2_name, diffs, summary, old_html=None, new_html=None, embed_css=True,
+                       generated_on=None):
+    """
+    Create HTML content for export with comparison results.
     
     Args:
         pdf1_name (str): The name of the first PDF
         pdf2_name (str): The name of the second PDF
-        diffs (list): List of difference objects
+        diffs (Diffs): Differences from compare_texts, only read when
+            old_html or new_html is not given
         summary (dict): Summary of the comparison
+        old_html (str, optional): Pre-rendered highlight_differences(diffs, 'old')
+        new_html (str, optional): Pre-rendered highlight_differences(diffs, 'new')
+        embed_css (bool, optional): Include the report stylesheet in the page.
+            Turn off when the stylesheet is supplied separately.
+        generated_on (str, optional): Text of the "Generated on" line,
+            defaults to the current time in REPORT_TIME_FORMAT
         
     Returns:
-        tuple: (html_string, filename)
+        str: HTML content
     """
-    html_content = create_export_html(pdf1_name, pdf2_name, diffs, summary)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"comparison_report_{timestamp}.html"
+    # Reuse the highlighted documents if the caller already rendered them
+    if old_html is None:
+        old_html = highlight_differences(diffs, 'old')
+    if new_html is None:
+        new_html = highlight_differences(diffs, 'new')
+    
+    # Format current date and time, unless the caller supplied it
+    current_time = generated_on
+    if current_time is None:
+        current_time = datetime.now().strftime(REPORT_TIME_FORMAT)
+    
+    # Fill in the dynamic parts of the report
+    summary_html = _HTML_SUMMARY.format_map({
+        'current_time': current_time,
+        'pdf1_name': pdf1_name,
+        'pdf2_name': pdf2_name,
+        'additions_count': summary['additions']['count'],
+        'additions_words': summary['additions']['words'],
+        'deletions_count': summary['deletions']['count'],
+        'deletions_words': summary['deletions']['words'],
+        'modifications_count': summary['modifications']['count'],
+        'modifications_words': summary['modifications']['words_new'] - summary['modifications']['words_old'],
+        'unchanged_count': summary['unchanged']['count']
+    })
+    details_html = _HTML_DETAILS.format_map({'old_html': old_html, 'new_html': new_html})
     
-    return html_content, filename
+    head = _HTML_HEAD if embed_css else _HTML_HEAD_UNSTYLED
+    return "".join([head, summary_html, details_html, _HTML_FOOTER])
 
-def export_as_pdf(pdf1_name, pdf2_name, diffs, summary):
+def render_pdf_report(pdf1_name, pdf2_name, diffs, summary, old_html=None, new_html=None, generated_on=None):
     """
-    Generate a PDF file for download
+    Render the comparison report as a PDF document
     
     Args:
         pdf1_name (str): The name of the first PDF
         pdf2_name (str): The name of the second PDF
-        diffs (list): List of difference objects
+        diffs (Diffs): Differences from compare_texts, only read when
+            old_html or new_html is not given
         summary (dict): Summary of the comparison
+        old_html (str, optional): Pre-rendered highlighted first document
+        new_html (str, optional): Pre-rendered highlighted second document
+        generated_on (str, optional): Text of the "Generated on" line,
+            defaults to the current time
         
     Returns:
-        tuple: (pdf_bytes, filename)
+        bytes: The PDF document
     """
-    html_content = create_export_html(pdf1_name, pdf2_name, diffs, summary)
+    # The stylesheet is passed to WeasyPrint pre-parsed instead of inline
+    html_content = create_export_html(pdf1_name, pdf2_name, diffs, summary, old_html, new_html,
+                                      embed_css=False, generated_on=generated_on)
     
-    # Create a temporary file to store the HTML
-    with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as f:
-        f.write(html_content.encode('utf-8'))
-        temp_html_path = f.name
-    
-    try:
-        # Convert HTML to PDF
-        pdf_bytes = weasyprint.HTML(filename=temp_html_path).write_pdf()
-        
-        # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"comparison_report_{timestamp}.pdf"
-        
-        return pdf_bytes, filename
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_html_path):
-            os.unlink(temp_html_path)
\ No newline at end of file
+    # Convert HTML to PDF straight from memory
+    return weasyprint.HTML(string=html_content).write_pdf(
+        stylesheets=[_export_stylesheet()],
+        font_config=_font_config()
+    )
@@ -1,31 +1,104 @@
+import pymupdf
 import PyPDF2
-from io import StringIO
+from io import BytesIO
 import re
 
-def extract_text_from_pdf(pdf_path):
+# Patterns used by clean_text, compiled once at import
+_WS_RE = re.compile(r'[^\S\n]+')
+_LINE_BREAK_RE = re.compile(r' ?\n ?')
+_BLANK_RE = re.compile(r'(\n\s*){3,}')
+
+def extract_text_from_pdf(pdf_bytes):
     """
     Extract text from a PDF file.
     
+    Uses PyMuPDF for extraction and falls back to PyPDF2 if PyMuPDF
+    cannot open or read the document. PyMuPDF's text blocks become the
+    paragraphs of the result, separated by blank lines.
+    
+    Args:
+        pdf_bytes (bytes): Contents of the PDF file
+        
+    Returns:
+        str: Extracted text content, or an empty string if the PDF has no
+            extractable text (e.g. a scanned document)
+        
+    Raises:
+        ValueError: If the PDF is encrypted or can't be read at all
+    """
+    try:
+        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    except Exception:
+        # PyMuPDF couldn't open the file, let PyPDF2 have a go
+        return _extract_text_with_pypdf2(pdf_bytes)
+    
+    # Check if PDF is encrypted
+    if doc.needs_pass and not doc.authenticate(''):
+        doc.close()
+        raise ValueError("This PDF is encrypted and cannot be processed.")
+    
+    try:
+        # Extract text from each page. This stays serial: a page takes
+        # 0.2-3 ms, while a process pool costs ~60 ms to start (each worker
+        # re-opening the document) and would fork the threaded Streamlit
+        # server.
+        parts = [_extract_page_paragraphs(page) for page in doc]
+    except Exception:
+        return _extract_text_with_pypdf2(pdf_bytes)
+    finally:
+        doc.close()
+    
+    # The blocks are already stripped paragraphs, so clean_text isn't needed
+    text = "\n\n".join(part for part in parts if part)
+    
+    # An empty result means no text could be extracted; the pages are
+    # already stripped, so whitespace-only text can't get this far
+    return text
+
+def _extract_page_paragraphs(page):
+    """
+    Extract the text blocks of a PDF page as paragraphs.
+    
     Args:
-        pdf_path (str): Path to the PDF file
+        page (pymupdf.Page): The page to extract
         
     Returns:
-        str: Extracted text content
+        str: The page's text blocks, stripped and separated by blank lines
+    """
+    # Each block is (x0, y0, x1, y1, text, block_no, block_type); block_type 0
+    # is text, 1 is an image. Blocks come back in reading order already.
+    blocks = (block[4].strip() for block in page.get_text("blocks") if block[6] == 0)
+    return "\n\n".join(block for block in blocks if block)
+
+def _extract_text_with_pypdf2(pdf_bytes):
     """
-    text = ""
+    Extract text from a PDF file using PyPDF2.
+    
+    Args:
+        pdf_bytes (bytes): Contents of the PDF file
+        
+    Returns:
+        str: Extracted text content, or an empty string if the PDF has no
+            extractable text
+        
+    Raises:
+        ValueError: If the PDF is encrypted or can't be read
+    """
+    parts = []
     
     try:
-        # Try using PyPDF2 first
-        with open(pdf_path, 'rb') as file:
+        with BytesIO(pdf_bytes) as file:
             pdf_reader = PyPDF2.PdfReader(file)
             
             # Check if PDF is encrypted
             if pdf_reader.is_encrypted:
                 try:
                     # Try with empty password
-                    pdf_reader.decrypt('')
-                except:
-                    return "This PDF is encrypted and cannot be processed."
+                    decrypted = pdf_reader.decrypt('')
+                except Exception:
+                    decrypted = False
+                if not decrypted:
+                    raise ValueError("This PDF is encrypted and cannot be processed.")
             
             # Extract text from each page
             for page_num in range(len(pdf_reader.pages)):
@@ -33,20 +106,18 @@ def extract_text_from_pdf(pdf_path):
                 page_text = page.extract_text()
                 
                 if page_text:
-                    text += page_text + "\n\n"
-        
-        # Clean up the text
-        text = clean_text(text)
-        
-        # If we couldn't extract any text, the PDF might be scanned
-        if not text.strip():
-            return "No text could be extracted. This might be a scanned document or image-based PDF."
-            
-        return text
-        
+                    parts.append(page_text)
+    except ValueError:
+        # Already a readable reason, e.g. that the PDF is encrypted
+        raise
     except Exception as e:
-        # Handle the exception
-        return f"Error extracting text: {str(e)}"
+        # Report the failure instead of returning the message as if it were
+        # the document's text, which would then be compared
+        raise ValueError(f"Error extracting text: {str(e)}") from e
+    
+    # Clean up the text; this leaves an empty string if no text could be
+    # extracted
+    return clean_text("\n\n".join(parts))
 
 def clean_text(text):
     """
@@ -58,14 +129,14 @@ def clean_text(text):
     Returns:
         str: Cleaned text
     """
-    # Remove excessive whitespace and normalize line breaks
-    text = re.sub(r'\s+', ' ', text)
+    # Remove excessive whitespace within lines, but keep the line breaks
+    # so paragraph boundaries survive for the comparison
+    text = _WS_RE.sub(' ', text)
+    text = _LINE_BREAK_RE.sub('\n', text)
     
     # Normalize line breaks
-    text = re.sub(r'(\n\s*){3,}', '\n\n', text)
+    text = _BLANK_RE.sub('\n\n', text)
     
     # Split text into paragraphs for better comparison
-    paragraphs = text.split('\n\n')
-    clean_paragraphs = [p.strip() for p in paragraphs if p.strip()]
-    
-    return '\n\n'.join(clean_paragraphs)
+    paragraphs = map(str.strip, text.split('\n\n'))
+    return '\n\n'.join(p for p in paragraphs if p)
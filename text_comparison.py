@@ -1,5 +1,366 @@
 import difflib
 import re
+from itertools import compress
+from dataclasses import dataclass, field
+
+try:
+    # rapidfuzz computes the diff in C; without it we fall back to difflib
+    from rapidfuzz.distance import Indel
+except ImportError:
+    Indel = None
+
+# Above this many characters, only the common start and end of the documents
+# are matched, and the differing middle is reported as one change instead of
+# being diffed paragraph by paragraph and sentence by sentence
+MAX_DIFF_CHARS = 5_000_000
+
+# rapidfuzz's Indel needs about one bit of memory per pair of differing
+# items (50 MB at 20k x 20k); above this many pairs the difflib matcher,
+# whose memory grows linearly, is used instead
+MAX_INDEL_PAIRS = 400_000_000
+
+# Above this average paragraph length the text has few real paragraph
+# breaks (e.g. one block per page), so it is diffed line by line instead
+LINE_DIFF_PARAGRAPH_CHARS = 2000
+
+# Sentence boundaries: a sentence-ending punctuation mark and the whitespace
+# after it. The mark is captured rather than matched with a lookbehind, so
+# the regex engine can scan ahead for it instead of testing every position.
+_SENTENCE_SPLIT_RE = re.compile(r'([.!?])\s+')
+
+# Characters that could be read as HTML or CSS, mapped to their entities
+_SANITIZE_TABLE = str.maketrans({'<': '&lt;', '>': '&gt;', '{': '&#123;', '}': '&#125;'})
+
+# Codes for the type of each difference, one byte per entry in Diffs.types
+TYPE_EQUAL = 0
+TYPE_ADDED = 1
+TYPE_DELETED = 2
+TYPE_MODIFIED = 3
+
+# bytes.translate tables turning Diffs.types into 1/0 masks, one per code
+_TYPE_MASKS = [bytes(1 if code == type_code else 0 for code in range(256))
+               for type_code in (TYPE_EQUAL, TYPE_ADDED, TYPE_DELETED, TYPE_MODIFIED)]
+
+@dataclass(slots=True)
+class Diffs:
+    """
+    Differences between two documents, stored as parallel columns.
+    
+    Entry i has the type code types[i] (TYPE_EQUAL, TYPE_ADDED,
+    TYPE_DELETED or TYPE_MODIFIED), the content old_texts[i] in the first
+    document ('' for additions) and the content new_texts[i] in the second
+    document ('' for deletions).
+    """
+    types: bytearray = field(default_factory=bytearray)
+    old_texts: list = field(default_factory=list)
+    new_texts: list = field(default_factory=list)
+    
+    def __len__(self):
+        return len(self.types)
+    
+    def append(self, diff_type, old_text, new_text):
+        """
+        Add one difference to the end.
+        
+        Args:
+            diff_type (int): One of the TYPE_* codes
+            old_text (str): Content in the first document
+            new_text (str): Content in the second document
+        """
+        self.types.append(diff_type)
+        self.old_texts.append(old_text)
+        self.new_texts.append(new_text)
+    
+    def extend(self, diff_type, old_texts, new_texts):
+        """
+        Add a run of differences of the same type to the end.
+        
+        Args:
+            diff_type (int): One of the TYPE_* codes
+            old_texts (list): Contents in the first document
+            new_texts (list): Contents in the second document, one per old text
+        """
+        self.types += bytes((diff_type,)) * len(old_texts)
+        self.old_texts += old_texts
+        self.new_texts += new_texts
+    
+    def extend_from(self, other):
+        """
+        Add all differences of another Diffs to the end.
+        
+        Args:
+            other (Diffs): The differences to add
+        """
+        self.types += other.types
+        self.old_texts += other.old_texts
+        self.new_texts += other.new_texts
+
+class _CachedSequenceMatcher(difflib.SequenceMatcher):
+    """
+    SequenceMatcher with a faster find_longest_match.
+    
+    The stock implementation filters b2j[a[i]] against the [blo, bhi) window
+    for every i, even when the same element of a repeats many times (common
+    with PDF headers and footers). This version filters each distinct
+    element once per call and reuses the result, which removes the bounds
+    checks from the innermost loop.
+    """
+    
+    def find_longest_match(self, alo=0, ahi=None, blo=0, bhi=None):
+        a, b, b2j, isbjunk = self.a, self.b, self.b2j, self.bjunk.__contains__
+        if ahi is None:
+            ahi = len(a)
+        if bhi is None:
+            bhi = len(b)
+        besti, bestj, bestsize = alo, blo, 0
+        
+        # Find longest junk-free match. During an iteration of the loop,
+        # j2len[j] = length of longest junk-free match ending with a[i-1]
+        # and b[j]; b2j_cache holds the in-window positions of each a[i]
+        j2len = {}
+        nothing = []
+        b2j_cache = {}
+        for i in range(alo, ahi):
+            ai = a[i]
+            js = b2j_cache.get(ai)
+            if js is None:
+                js = b2j_cache[ai] = [j for j in b2j.get(ai, nothing) if blo <= j < bhi]
+            j2lenget = j2len.get
+            newj2len = {}
+            for j in js:
+                k = newj2len[j] = j2lenget(j - 1, 0) + 1
+                if k > bestsize:
+                    besti, bestj, bestsize = i - k + 1, j - k + 1, k
+            j2len = newj2len
+        
+        # Extend the best by non-junk elements on each end, then suck up
+        # matching junk on each side, exactly as difflib does
+        while besti > alo and bestj > blo and \
+              not isbjunk(b[bestj - 1]) and \
+              a[besti - 1] == b[bestj - 1]:
+            besti, bestj, bestsize = besti - 1, bestj - 1, bestsize + 1
+        while besti + bestsize < ahi and bestj + bestsize < bhi and \
+              not isbjunk(b[bestj + bestsize]) and \
+              a[besti + bestsize] == b[bestj + bestsize]:
+            bestsize += 1
+        while besti > alo and bestj > blo and \
+              isbjunk(b[bestj - 1]) and \
+              a[besti - 1] == b[bestj - 1]:
+            besti, bestj, bestsize = besti - 1, bestj - 1, bestsize + 1
+        while besti + bestsize < ahi and bestj + bestsize < bhi and \
+              isbjunk(b[bestj + bestsize]) and \
+              a[besti + bestsize] == b[bestj + bestsize]:
+            bestsize += 1
+        
+        return difflib.Match(besti, bestj, bestsize)
+
+def _get_opcodes(a, b, autojunk=True, match=True):
+    """
+    Compute difflib-style opcodes that turn sequence a into sequence b.
+    
+    Uses rapidfuzz's C implementation when it is installed and
+    _CachedSequenceMatcher otherwise, or when the differing middle of the
+    sequences is too long for rapidfuzz's memory use (MAX_INDEL_PAIRS).
+    
+    Args:
+        a (list): First sequence of hashable items (paragraphs, sentences)
+        b (list): Second sequence of hashable items
+        autojunk (bool): Let the difflib fallback ignore items that make up
+            more than 1% of a long b (see difflib.SequenceMatcher)
+        match (bool): Match the items between the common prefix and suffix.
+            When False, those items are reported as a single change.
+        
+    Returns:
+        list: (tag, i1, i2, j1, j2) tuples, where tag is 'equal', 'replace',
+            'delete' or 'insert'
+    """
+    # Map each distinct item to a small int, hashing and comparing every
+    # string once here. The matchers then only compare ints, which are cheap
+    # however often an item (e.g. a repeated header or footer) is probed.
+    item_ids = {}
+    a_ids = [item_ids.setdefault(item, len(item_ids)) for item in a]
+    b_ids = [item_ids.setdefault(item, len(item_ids)) for item in b]
+    
+    # rapidfuzz handles bytes fastest, so pack the ids when few enough
+    if Indel is not None and len(item_ids) <= 256:
+        a_ids, b_ids = bytes(a_ids), bytes(b_ids)
+    
+    # Near-identical texts share long runs of items at both ends. Take those
+    # as equal directly and only run the matcher on the differing middle.
+    start = _common_prefix_length(a_ids, b_ids)
+    suffix = _common_prefix_length(a_ids[start:][::-1], b_ids[start:][::-1])
+    a_end, b_end = len(a_ids) - suffix, len(b_ids) - suffix
+    
+    opcodes = []
+    if start:
+        opcodes.append(('equal', 0, start, 0, start))
+    if start < a_end or start < b_end:
+        if match:
+            for tag, i1, i2, j1, j2 in _match_ids(a_ids[start:a_end], b_ids[start:b_end], autojunk):
+                opcodes.append((tag, i1 + start, i2 + start, j1 + start, j2 + start))
+        else:
+            opcodes.append((_change_tag(start, a_end, start, b_end), start, a_end, start, b_end))
+    if a_end < len(a_ids):
+        opcodes.append(('equal', a_end, len(a_ids), b_end, len(b_ids)))
+    
+    return opcodes
+
+def _common_prefix_length(a, b):
+    """
+    Count the leading items two sequences have in common.
+    
+    Args:
+        a (list or bytes): First sequence
+        b (list or bytes): Second sequence
+        
+    Returns:
+        int: Length of the longest common prefix
+    """
+    limit = min(len(a), len(b))
+    
+    # Skip ahead in doubling chunks, each compared in C, until one differs
+    i, step = 0, 1
+    while i < limit and a[i:i + step] == b[i:i + step]:
+        i += step
+        step *= 2
+    
+    # Then halve the differing chunk until the first differing item is left
+    while step > 1 and i < limit:
+        step //= 2
+        if a[i:i + step] == b[i:i + step]:
+            i += step
+    
+    return min(i, limit)
+
+def _match_ids(a_ids, b_ids, autojunk):
+    """
+    Compute difflib-style opcodes between two sequences of item ids.
+    
+    Args:
+        a_ids (list or bytes): Item ids of the first sequence
+        b_ids (list or bytes): Item ids of the second sequence
+        autojunk (bool): Passed on to the difflib fallback
+        
+    Returns:
+        list: (tag, i1, i2, j1, j2) tuples, as for _get_opcodes
+    """
+    # With one side empty the whole change is a single insert or delete
+    if not a_ids or not b_ids:
+        return [(_change_tag(0, len(a_ids), 0, len(b_ids)), 0, len(a_ids), 0, len(b_ids))]
+    
+    if Indel is None or len(a_ids) * len(b_ids) > MAX_INDEL_PAIRS:
+        return _CachedSequenceMatcher(None, a_ids, b_ids, autojunk=autojunk).get_opcodes()
+    
+    # Indel only inserts and deletes, so merge the changes between two equal
+    # blocks into a single replace/delete/insert opcode, like difflib does
+    opcodes = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in Indel.opcodes(a_ids, b_ids).as_list():
+        if tag != 'equal':
+            continue
+        if i < i1 or j < j1:
+            opcodes.append((_change_tag(i, i1, j, j1), i, i1, j, j1))
+        opcodes.append(('equal', i1, i2, j1, j2))
+        i, j = i2, j2
+    if i < len(a_ids) or j < len(b_ids):
+        opcodes.append((_change_tag(i, len(a_ids), j, len(b_ids)), i, len(a_ids), j, len(b_ids)))
+    
+    return opcodes
+
+def _change_tag(i1, i2, j1, j2):
+    # Name the change from a[i1:i2] to b[j1:j2] the way difflib would
+    if i1 < i2 and j1 < j2:
+        return 'replace'
+    return 'delete' if i1 < i2 else 'insert'
+
+def _group_lines(lines):
+    """
+    Group consecutive lines back into their blank-line separated paragraphs.
+    
+    Args:
+        lines (list): Lines of text, where '' marks a paragraph break
+        
+    Returns:
+        list: The non-empty paragraphs formed by the lines
+    """
+    chunks = ('\n'.join(lines)).split('\n\n')
+    return [chunk.strip('\n') for chunk in chunks if chunk.strip('\n')]
+
+def _split_sentences(text):
+    """
+    Split text into sentences at whitespace after '.', '!' or '?'.
+    
+    Args:
+        text (str): Text to split
+        
+    Returns:
+        list: The sentences, each keeping its closing punctuation mark
+    """
+    # split() alternates text and captured marks; put each mark back on the
+    # end of the sentence it closes
+    parts = _SENTENCE_SPLIT_RE.split(text)
+    return list(map(str.__add__, parts[0::2], parts[1::2] + ['']))
+
+def _paragraph_sentences(paragraphs):
+    """
+    Split a block of paragraphs into their sentences.
+    
+    Args:
+        paragraphs (list): Paragraphs of the block
+        
+    Returns:
+        list: The non-empty sentences, in order
+    """
+    # A paragraph break always ends a sentence, so each paragraph is split on
+    # its own rather than joining the block only to split it again
+    return [sentence for paragraph in paragraphs
+            for sentence in _split_sentences(paragraph) if sentence.strip()]
+
+def _line_sentences(lines):
+    """
+    Split a block of lines into their sentences.
+    
+    Args:
+        lines (list): Lines of the block, where '' marks a paragraph break
+        
+    Returns:
+        list: The non-empty sentences, in order
+    """
+    # Sentences run across line breaks, so the lines are split together.
+    # Blank lines leave empty pieces, which are dropped so that e.g. a blank
+    # line replaced by text comes out as an addition.
+    return [sentence for sentence in _split_sentences('\n'.join(lines)) if sentence.strip()]
+
+def _diff_sentences(old_sentences, new_sentences):
+    """
+    Diff one block of modified paragraphs sentence by sentence.
+    
+    Args:
+        old_sentences (list): The block's sentences in the first document
+        new_sentences (list): The block's sentences in the second document
+        
+    Returns:
+        Diffs: The differences between the block's sentences
+    """
+    differences = Diffs()
+    append = differences.append
+    extend = differences.extend
+    
+    # Sentence lists are short, so match them exactly without junking
+    sentence_opcodes = _get_opcodes(old_sentences, new_sentences, autojunk=False)
+    
+    for s_tag, s_i1, s_i2, s_j1, s_j2 in sentence_opcodes:
+        if s_tag == 'equal':
+            sentences = old_sentences[s_i1:s_i2]
+            extend(TYPE_EQUAL, sentences, sentences)
+        elif s_tag == 'replace':
+            append(TYPE_MODIFIED, ' '.join(old_sentences[s_i1:s_i2]), ' '.join(new_sentences[s_j1:s_j2]))
+        elif s_tag == 'delete':
+            append(TYPE_DELETED, ' '.join(old_sentences[s_i1:s_i2]), '')
+        elif s_tag == 'insert':
+            append(TYPE_ADDED, '', ' '.join(new_sentences[s_j1:s_j2]))
+    
+    return differences
 
 def compare_texts(text1, text2):
     """
@@ -10,16 +371,19 @@ def compare_texts(text1, text2):
         text2 (str): Text from the second document
         
     Returns:
-        list: A list of difference objects containing type and content
+        Diffs: The differences, in document order
     """
     # Sanitize input text to prevent any HTML/CSS display
     def sanitize_for_display(text):
-        # Replace HTML tags and CSS that might be in the PDF
-        text = text.replace('<', '&lt;').replace('>', '&gt;')
-        # Replace other code-like patterns
-        text = text.replace('{', '&#123;').replace('}', '&#125;')
-        return text
+        # Replace HTML tags, CSS and other code-like patterns that might be
+        # in the PDF, in a single scan over the text
+        return text.translate(_SANITIZE_TABLE)
         
+    # Identical documents need no diffing: every paragraph is unchanged
+    if text1 == text2:
+        paragraphs = sanitize_for_display(text1).split('\n\n')
+        return Diffs(bytearray([TYPE_EQUAL]) * len(paragraphs), paragraphs, list(paragraphs))
+    
     # Sanitize inputs before comparison
     text1 = sanitize_for_display(text1)
     text2 = sanitize_for_display(text2)
@@ -27,123 +391,105 @@ def compare_texts(text1, text2):
     paragraphs1 = text1.split('\n\n')
     paragraphs2 = text2.split('\n\n')
     
-    # Create a SequenceMatcher object to compare the paragraphs
-    matcher = difflib.SequenceMatcher(None, paragraphs1, paragraphs2)
+    # A few huge paragraphs make poor diff units: one changed word turns the
+    # whole paragraph into a replace. Diff such texts by line instead and
+    # regroup the lines into paragraphs when emitting the differences.
+    longest_average = max(len(text1) / len(paragraphs1), len(text2) / len(paragraphs2))
+    if longest_average > LINE_DIFF_PARAGRAPH_CHARS:
+        units1 = text1.split('\n')
+        units2 = text2.split('\n')
+        separator = '\n'
+        group = _group_lines
+        split_block = _line_sentences
+    else:
+        units1 = paragraphs1
+        units2 = paragraphs2
+        separator = '\n\n'
+        group = list
+        split_block = _paragraph_sentences
+    
+    # Matching paragraphs and re-diffing them by sentence gets too slow on
+    # huge inputs, so those only get their common start and end matched
+    within_limit = max(len(text1), len(text2)) <= MAX_DIFF_CHARS
     
-    # Get the differences as opcodes
-    opcodes = matcher.get_opcodes()
+    # Compare the paragraphs and get the differences as opcodes. Documents
+    # often have hundreds of paragraphs, so keep difflib's junk heuristic.
+    opcodes = _get_opcodes(units1, units2, autojunk=True, match=within_limit)
     
-    # Process the opcodes to create a list of difference objects
-    differences = []
+    # Process the opcodes into the differences. Runs of equal, deleted and
+    # added content are copied into the columns in bulk.
+    differences = Diffs()
+    append = differences.append
+    extend = differences.extend
     
     for tag, i1, i2, j1, j2 in opcodes:
         if tag == 'equal':
             # Content is the same in both documents
-            for i in range(i1, i2):
-                differences.append({
-                    'type': 'equal',
-                    'old_content': paragraphs1[i],
-                    'new_content': paragraphs1[i]
-                })
+            paragraphs = group(units1[i1:i2])
+            extend(TYPE_EQUAL, paragraphs, paragraphs)
         elif tag == 'replace':
             # Content is modified
-            old_content = '\n\n'.join(paragraphs1[i1:i2])
-            new_content = '\n\n'.join(paragraphs2[j1:j2])
-            
-            # For better granularity, compare the sentences within paragraphs
-            old_sentences = re.split(r'(?<=[.!?])\s+', old_content)
-            new_sentences = re.split(r'(?<=[.!?])\s+', new_content)
-            
-            sentence_matcher = difflib.SequenceMatcher(None, old_sentences, new_sentences)
-            sentence_opcodes = sentence_matcher.get_opcodes()
-            
-            for s_tag, s_i1, s_i2, s_j1, s_j2 in sentence_opcodes:
-                if s_tag == 'equal':
-                    for s_i in range(s_i1, s_i2):
-                        differences.append({
-                            'type': 'equal',
-                            'old_content': old_sentences[s_i],
-                            'new_content': old_sentences[s_i]
-                        })
-                elif s_tag == 'replace':
-                    differences.append({
-                        'type': 'modified',
-                        'old_content': ' '.join(old_sentences[s_i1:s_i2]),
-                        'new_content': ' '.join(new_sentences[s_j1:s_j2])
-                    })
-                elif s_tag == 'delete':
-                    differences.append({
-                        'type': 'deleted',
-                        'old_content': ' '.join(old_sentences[s_i1:s_i2]),
-                        'new_content': ''
-                    })
-                elif s_tag == 'insert':
-                    differences.append({
-                        'type': 'added',
-                        'old_content': '',
-                        'new_content': ' '.join(new_sentences[s_j1:s_j2])
-                    })
+            if within_limit:
+                # For better granularity, compare the sentences within
+                # the block of modified paragraphs
+                differences.extend_from(_diff_sentences(split_block(units1[i1:i2]), split_block(units2[j1:j2])))
+            else:
+                append(TYPE_MODIFIED, separator.join(units1[i1:i2]), separator.join(units2[j1:j2]))
         elif tag == 'delete':
             # Content is deleted in the second document
-            for i in range(i1, i2):
-                differences.append({
-                    'type': 'deleted',
-                    'old_content': paragraphs1[i],
-                    'new_content': ''
-                })
+            paragraphs = group(units1[i1:i2])
+            extend(TYPE_DELETED, paragraphs, [''] * len(paragraphs))
         elif tag == 'insert':
             # Content is added in the second document
-            for j in range(j1, j2):
-                differences.append({
-                    'type': 'added',
-                    'old_content': '',
-                    'new_content': paragraphs2[j]
-                })
+            paragraphs = group(units2[j1:j2])
+            extend(TYPE_ADDED, [''] * len(paragraphs), paragraphs)
     
     return differences
 
+def _count_words(texts, types, type_code):
+    """
+    Count the words in the entries of one type.
+    
+    Args:
+        texts (list): Contents of the entries, e.g. Diffs.old_texts
+        types (bytearray): Type codes of the entries
+        type_code (int): The TYPE_* code of the entries to count
+        
+    Returns:
+        int: The number of words in the matching entries
+    """
+    # The mask, selection and splitting all run in C, so entries of other
+    # types (usually most of them are unchanged) are skipped without a
+    # Python-level step. Words are counted with split() rather than by
+    # counting spaces, since extracted text also separates words with
+    # newlines and runs of spaces.
+    selected = compress(texts, types.translate(_TYPE_MASKS[type_code]))
+    return sum(map(len, map(str.split, selected)))
+
 def generate_summary(diffs):
     """
     Generate a summary of differences.
     
     Args:
-        diffs (list): List of difference objects
+        diffs (Diffs): Differences from compare_texts
         
     Returns:
         dict: Summary statistics
     """
-    added = 0
-    deleted = 0
-    modified = 0
-    unchanged = 0
-    
-    added_content = []
-    deleted_content = []
-    modified_content = []
-    
-    for diff in diffs:
-        if diff['type'] == 'added':
-            added += 1
-            added_content.append(diff['new_content'])
-        elif diff['type'] == 'deleted':
-            deleted += 1
-            deleted_content.append(diff['old_content'])
-        elif diff['type'] == 'modified':
-            modified += 1
-            modified_content.append({
-                'old': diff['old_content'],
-                'new': diff['new_content']
-            })
-        elif diff['type'] == 'equal':
-            unchanged += 1
+    # Count each type in C over the one-byte type codes
+    types = diffs.types
+    added = types.count(TYPE_ADDED)
+    deleted = types.count(TYPE_DELETED)
+    modified = types.count(TYPE_MODIFIED)
+    unchanged = types.count(TYPE_EQUAL)
     
-    total_elements = added + deleted + modified + unchanged
+    # Total the words of the changed entries
+    added_words = _count_words(diffs.new_texts, types, TYPE_ADDED)
+    deleted_words = _count_words(diffs.old_texts, types, TYPE_DELETED)
+    modified_words_old = _count_words(diffs.old_texts, types, TYPE_MODIFIED)
+    modified_words_new = _count_words(diffs.new_texts, types, TYPE_MODIFIED)
     
-    # Calculate total words for each type
-    added_words = sum(len(content.split()) for content in added_content)
-    deleted_words = sum(len(content.split()) for content in deleted_content)
-    modified_words_old = sum(len(item['old'].split()) for item in modified_content)
-    modified_words_new = sum(len(item['new'].split()) for item in modified_content)
+    total_elements = added + deleted + modified + unchanged
     
     return {
         'total_elements': total_elements,
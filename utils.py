@@ -1,88 +1,123 @@
 import streamlit as st
+from text_comparison import TYPE_EQUAL, TYPE_ADDED, TYPE_DELETED, TYPE_MODIFIED
 
-def highlight_differences(diffs, version='new'):
+# Escapes < and > in a single pass so diff content is shown as plain text.
+# compare_texts has already turned these into entities, so & must be left
+# alone here or the entities would be escaped twice.
+_ESCAPE_TABLE = str.maketrans({'<': '&lt;', '>': '&gt;'})
+
+# HTML templates for the highlighted entries, filled in with % formatting
+_TPL_UNCHANGED = "<p style='margin-bottom: 8px; line-height: 1.5;'>%s</p>"
+_TPL_ADDITION = "<p id='%s-addition-%d' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #CCFFCC; padding: 2px 0; border-radius: 3px;'>%s</span></p>"
+_TPL_DELETION = "<p id='%s-deletion-%d' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #FFCCCC; padding: 2px 0; border-radius: 3px;'>%s</span></p>"
+_TPL_MODIFICATION = "<p id='%s-modification-%d' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #FFFFCC; padding: 2px 0; border-radius: 3px;'>%s</span></p>"
+
+# Placeholders for content that only exists in the other document
+_PLACEHOLDER_STYLE = "margin-bottom: 8px; line-height: 1.5; background-color: #F8F8F8; color: #888888; padding: 10px; border-radius: 5px; font-style: italic;"
+_ONLY_IN_SECOND = "<p style='%s'>[Content only in second document]</p>" % _PLACEHOLDER_STYLE
+_ONLY_IN_FIRST = "<p style='%s'>[Content only in first document]</p>" % _PLACEHOLDER_STYLE
+
+def _highlight_old(diffs):
     """
-    Format the differences with HTML highlighting and add navigable anchors.
+    Format the first document's side of the differences as highlighted HTML.
     
     Args:
-        diffs (list): List of difference objects
-        version (str): 'old' for first document, 'new' for second document
+        diffs (Diffs): Differences from compare_texts
         
     Returns:
-        str: HTML formatted text with highlighted differences and navigation anchors
+        str: HTML with deletions and modifications highlighted and anchored
     """
-    highlighted_text = ""
+    # Collect the HTML pieces and join them once at the end
+    parts = []
+    append = parts.append
+    # Escaping < and > keeps code blocks in the PDF displayed as plain text
+    escape = _ESCAPE_TABLE
     
     # Counters for unique IDs
-    addition_count = 0
     deletion_count = 0
     modification_count = 0
     
-    # Helper function to make text safe for HTML display
-    # This will ensure code blocks are displayed as plain text
-    def sanitize_content(content):
-        # Replace < and > to prevent any HTML/code rendering
-        content = content.replace('<', '&lt;').replace('>', '&gt;')
-        return content
-    
-    if version == 'old':
-        for diff in diffs:
-            if diff['type'] == 'equal':
-                highlighted_text += f"<p style='margin-bottom: 8px; line-height: 1.5;'>{sanitize_content(diff['old_content'])}</p>"
-            elif diff['type'] == 'added':
-                # Show an empty placeholder for content that's only in the new document
-                highlighted_text += f"<p style='margin-bottom: 8px; line-height: 1.5; background-color: #F8F8F8; color: #888888; padding: 10px; border-radius: 5px; font-style: italic;'>[Content only in second document]</p>"
-            elif diff['type'] == 'deleted':
-                deletion_count += 1
-                highlighted_text += f"<p id='{version}-deletion-{deletion_count}' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #FFCCCC; padding: 2px 0; border-radius: 3px;'>{sanitize_content(diff['old_content'])}</span></p>"
-            elif diff['type'] == 'modified':
-                modification_count += 1
-                highlighted_text += f"<p id='{version}-modification-{modification_count}' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #FFFFCC; padding: 2px 0; border-radius: 3px;'>{sanitize_content(diff['old_content'])}</span></p>"
-    else:  # version == 'new'
-        for diff in diffs:
-            if diff['type'] == 'equal':
-                highlighted_text += f"<p style='margin-bottom: 8px; line-height: 1.5;'>{sanitize_content(diff['new_content'])}</p>"
-            elif diff['type'] == 'added':
-                addition_count += 1
-                highlighted_text += f"<p id='{version}-addition-{addition_count}' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #CCFFCC; padding: 2px 0; border-radius: 3px;'>{sanitize_content(diff['new_content'])}</span></p>"
-            elif diff['type'] == 'deleted':
-                # Show an empty placeholder for content that's only in the old document
-                highlighted_text += f"<p style='margin-bottom: 8px; line-height: 1.5; background-color: #F8F8F8; color: #888888; padding: 10px; border-radius: 5px; font-style: italic;'>[Content only in first document]</p>"
-            elif diff['type'] == 'modified':
-                modification_count += 1
-                highlighted_text += f"<p id='{version}-modification-{modification_count}' style='margin-bottom: 8px; line-height: 1.5;'><span style='background-color: #FFFFCC; padding: 2px 0; border-radius: 3px;'>{sanitize_content(diff['new_content'])}</span></p>"
-    
-    return highlighted_text
+    for diff_type, old_text in zip(diffs.types, diffs.old_texts):
+        if diff_type == TYPE_EQUAL:
+            append(_TPL_UNCHANGED % old_text.translate(escape))
+        elif diff_type == TYPE_ADDED:
+            # Show an empty placeholder for content that's only in the new document
+            append(_ONLY_IN_SECOND)
+        elif diff_type == TYPE_DELETED:
+            deletion_count += 1
+            append(_TPL_DELETION % ('old', deletion_count, old_text.translate(escape)))
+        elif diff_type == TYPE_MODIFIED:
+            modification_count += 1
+            append(_TPL_MODIFICATION % ('old', modification_count, old_text.translate(escape)))
+    
+    return ''.join(parts)
 
-def count_change_types(diffs):
+def _highlight_new(diffs):
     """
-    Count the number of each type of change in the diffs
+    Format the second document's side of the differences as highlighted HTML.
     
     Args:
-        diffs (list): List of difference objects
-    
+        diffs (Diffs): Differences from compare_texts
+        
     Returns:
-        tuple: Counts of additions, deletions, and modifications
+        str: HTML with additions and modifications highlighted and anchored
+    """
+    # Collect the HTML pieces and join them once at the end
+    parts = []
+    append = parts.append
+    # Escaping < and > keeps code blocks in the PDF displayed as plain text
+    escape = _ESCAPE_TABLE
+    
+    # Counters for unique IDs
+    addition_count = 0
+    modification_count = 0
+    
+    for diff_type, new_text in zip(diffs.types, diffs.new_texts):
+        if diff_type == TYPE_EQUAL:
+            append(_TPL_UNCHANGED % new_text.translate(escape))
+        elif diff_type == TYPE_ADDED:
+            addition_count += 1
+            append(_TPL_ADDITION % ('new', addition_count, new_text.translate(escape)))
+        elif diff_type == TYPE_DELETED:
+            # Show an empty placeholder for content that's only in the old document
+            append(_ONLY_IN_FIRST)
+        elif diff_type == TYPE_MODIFIED:
+            modification_count += 1
+            append(_TPL_MODIFICATION % ('new', modification_count, new_text.translate(escape)))
+    
+    return ''.join(parts)
+
+def highlight_differences(diffs, version='new'):
     """
-    additions = sum(1 for diff in diffs if diff['type'] == 'added')
-    deletions = sum(1 for diff in diffs if diff['type'] == 'deleted')
-    modifications = sum(1 for diff in diffs if diff['type'] == 'modified')
+    Format the differences with HTML highlighting and add navigable anchors.
     
-    return additions, deletions, modifications
+    Args:
+        diffs (Diffs): Differences from compare_texts
+        version (str): 'old' for first document, 'new' for second document
+        
+    Returns:
+        str: HTML formatted text with highlighted differences and navigation anchors
+    """
+    if version == 'old':
+        return _highlight_old(diffs)
+    return _highlight_new(diffs)
 
-def create_navigation_buttons(diffs, container_id, version):
+def create_navigation_buttons(summary, container_id, version):
     """
     Create navigation buttons for different types of changes
     
     Args:
-        diffs (list): List of difference objects
+        summary (dict): Summary from generate_summary, for the change counts
         container_id (str): ID of the container div
         version (str): 'old' or 'new' version
     
     Returns:
         str: HTML for navigation buttons
     """
-    additions, deletions, modifications = count_change_types(diffs)
+    # The summary already holds the counts, so the diffs aren't walked again
+    additions = summary['additions']['count']
+    deletions = summary['deletions']['count']
+    modifications = summary['modifications']['count']
     
     # Skip creating buttons if there are no changes
     if version == 'old' and additions == 0 and deletions == 0 and modifications == 0: